@@ -0,0 +1,38 @@
+'''
+Times the heavier stages of the analysis on the wrangled trip table.
+
+Usage (from the project folder, after the exploration notebook has stored the data):
+    python benchmark.py [wrangled_baywheels_2020.csv] > bench_output.txt
+'''
+import sys
+import time
+
+from trip_table import read_trip_table
+from demand_forecast import hourly_counts, DemandForecast
+
+
+def timed(results, label, function, *args, **kwargs):
+    '''
+    This function calls function(*args, **kwargs), stores how long it took under the given label, and returns its result.
+    '''
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    results.append((label, time.perf_counter() - start))
+    return result
+
+
+def main(csv_path='wrangled_baywheels_2020.csv'):
+    results = []
+    df = timed(results, 'load trip table', read_trip_table, csv_path, dtype={'rental_access_method': object})
+    counts = timed(results, 'aggregate hourly station counts', hourly_counts, df)
+    model = timed(results, 'forecast training', DemandForecast().fit, counts)
+    forecast = timed(results, 'forecast scoring (next 24h)', model.predict)
+
+    print(f'{len(df):,} trips, {counts.shape[1]:,} station / user type columns x {len(counts):,} hours'
+          f', {forecast.size:,} forecasts')
+    for label, seconds in results:
+        print(f'{label:<35}{seconds * 1000:>12.1f} ms')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,197 @@
+'''
+Customers vs. Subscribers statistics, computed straight from the trip table.
+
+CohortStats goes through the trips batch by batch (e.g. one month at a time) and keeps, for every user_type:
+the trip duration moments (merged with Welford / Chan's update, so batches can come in any order)
+, a one-second histogram of the durations (exact quantiles for trips under a day)
+, and the weekday / hour demand profile. permutation_test() then checks whether the differences between
+the two cohorts could just be chance, using batches of NumPy shuffles (once per pair of user types).
+'''
+import numpy as np
+import pandas as pd
+
+MAX_SECONDS = 24 * 3600 # Durations of a day or more share the last histogram bin
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+class CohortStats:
+    '''
+    Streaming per user_type statistics of the trips, e.g.
+
+        stats = CohortStats()
+        for month, month_df in wrangled_df.groupby('month', observed=True):
+            stats.add(month_df)
+        stats.table()
+    '''
+
+    def __init__(self):
+        self.cohorts = {}
+
+    def _cohort(self, user_type):
+        if user_type not in self.cohorts:
+            self.cohorts[user_type] = {
+                'n': 0, 'mean': 0.0, 'm2': 0.0, 'min': np.inf, 'max': -np.inf,
+                'histogram': np.zeros(MAX_SECONDS + 1, dtype=np.int64),
+                'profile': np.zeros((7, 24), dtype=np.int64),
+            }
+        return self.cohorts[user_type]
+
+    def add(self, df):
+        '''
+        This method adds a batch of trips (it needs 'duration_sec', 'start_time' and 'user_type'), and returns the stats itself.
+        '''
+        start = pd.to_datetime(df['start_time'])
+        user_type = df['user_type'].astype(str).to_numpy()
+        duration = df['duration_sec'].to_numpy(dtype=float)
+        day, hour = start.dt.dayofweek.to_numpy(), start.dt.hour.to_numpy()
+
+        for name in pd.unique(user_type):
+            mask = user_type == name
+            x = duration[mask]
+            cohort = self._cohort(name)
+
+            # Chan's parallel version of Welford's update: merging the batch's (n, mean, M2) into the running ones
+            n, mean = len(x), x.mean()
+            m2 = ((x - mean) ** 2).sum()
+            total = cohort['n'] + n
+            delta = mean - cohort['mean']
+            cohort['mean'] += delta * n / total
+            cohort['m2'] += m2 + delta ** 2 * cohort['n'] * n / total
+            cohort['n'] = total
+            cohort['min'], cohort['max'] = min(cohort['min'], x.min()), max(cohort['max'], x.max())
+
+            seconds = np.clip(x, 0, MAX_SECONDS).astype(np.int64)
+            cohort['histogram'] += np.bincount(seconds, minlength=MAX_SECONDS + 1)
+            cohort['profile'] += np.bincount(day[mask] * 24 + hour[mask], minlength=7 * 24).reshape(7, 24)
+        return self
+
+    def quantiles(self, user_type, q):
+        '''
+        This method returns the q quantile(s) of the trip duration in seconds, read from the histogram.
+        '''
+        cohort = self.cohorts[user_type]
+        cumulative = np.cumsum(cohort['histogram'])
+        return np.searchsorted(cumulative, np.asarray(q) * (cohort['n'] - 1), side='right').astype(float)
+
+    def profile(self, user_type):
+        '''
+        This method returns the number of trips by weekday (rows) and start hour (columns) for the given user_type.
+        '''
+        return pd.DataFrame(self.cohorts[user_type]['profile'], index=WEEKDAYS, columns=range(24))
+
+    def table(self):
+        '''
+        This method returns one row per user_type, with its share of trips, duration statistics in minutes
+        , busiest hour and weekday, and the share of its trips started on a weekend.
+        '''
+        total = sum(cohort['n'] for cohort in self.cohorts.values())
+        rows = {}
+        for name, cohort in self.cohorts.items():
+            p25, median, p75, p90 = self.quantiles(name, [0.25, 0.5, 0.75, 0.9]) / 60
+            profile = cohort['profile']
+            rows[name] = {
+                'trips': cohort['n'],
+                'share': cohort['n'] / total,
+                'mean_min': cohort['mean'] / 60,
+                'std_min': np.sqrt(cohort['m2'] / max(cohort['n'] - 1, 1)) / 60,
+                'min_min': cohort['min'] / 60,
+                'p25_min': p25,
+                'median_min': median,
+                'p75_min': p75,
+                'p90_min': p90,
+                'max_min': cohort['max'] / 60,
+                'peak_hour': int(profile.sum(axis=0).argmax()),
+                'peak_day': WEEKDAYS[profile.sum(axis=1).argmax()],
+                'weekend_share': profile[5:].sum() / cohort['n'],
+            }
+        return pd.DataFrame.from_dict(rows, orient='index').rename_axis('user_type')
+
+
+def permutation_test(a, b, statistics=('mean', 'std'), n_permutations=200, max_values=50_000, seed=None,
+                     max_batch_values=20_000_000):
+    '''
+    This function tests whether the differences in the statistics ('mean' and / or 'std') between samples a and b
+    could come from randomly splitting the pooled values, and returns a dataframe with the observed difference (a - b)
+    and the two-sided p-value of every statistic (NaN when a or b has less than two values).
+    When there are more than max_values values, the shuffles run on a random subsample of that size
+    , drawn from a and b in proportion (the reported differences still come from all the values).
+    All the statistics are computed from the same shuffles, which are done in batches
+    , each one a (permutations x values) array of at most max_batch_values.
+    '''
+    statistics = [statistics] if isinstance(statistics, str) else list(statistics)
+    unknown = set(statistics) - {'mean', 'std'}
+    if unknown:
+        raise ValueError(f"statistics must be 'mean' or 'std', got {sorted(unknown)}")
+
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    if len(a) < 2 or len(b) < 2:
+        return pd.DataFrame({'difference': np.nan, 'p_value': np.nan}, index=statistics)
+
+    def differences(sum_a, sum_sq_a, n_a, total, total_sq, n):
+        # The statistics of both groups only need the sums of a (b's are what is left of the totals)
+        n_b = n - n_a
+        mean_a, mean_b = sum_a / n_a, (total - sum_a) / n_b
+        std_a = np.sqrt(np.maximum(sum_sq_a - n_a * mean_a ** 2, 0) / (n_a - 1))
+        std_b = np.sqrt(np.maximum(total_sq - sum_sq_a - n_b * mean_b ** 2, 0) / (n_b - 1))
+        found = {'mean': mean_a - mean_b, 'std': std_a - std_b}
+        return np.array([found[statistic] for statistic in statistics])
+
+    def observe(a, b):
+        pooled = np.concatenate([a, b])
+        totals = (pooled.sum(), (pooled ** 2).sum(), len(pooled))
+        return pooled, totals, differences(a.sum(), (a ** 2).sum(), len(a), *totals)
+
+    _, _, observed = observe(a, b)
+    rng = np.random.default_rng(seed)
+    if len(a) + len(b) > max_values:
+        n_a = min(max(2, round(max_values * len(a) / (len(a) + len(b)))), len(a))
+        a, b = rng.choice(a, n_a, replace=False), rng.choice(b, min(max_values - n_a, len(b)), replace=False)
+    pooled, totals, tested = observe(a, b)
+
+    batch = max(1, min(n_permutations, max_batch_values // len(pooled)))
+    extreme, done = np.zeros(len(statistics), dtype=np.int64), 0
+    while done < n_permutations:
+        size = min(batch, n_permutations - done)
+        shuffled = rng.permuted(np.broadcast_to(pooled, (size, len(pooled))), axis=1)[:, :len(a)]
+        permuted = differences(shuffled.sum(axis=1), (shuffled ** 2).sum(axis=1), len(a), *totals)
+        extreme += np.count_nonzero(np.abs(permuted) >= np.abs(tested)[:, None], axis=1)
+        done += size
+    return pd.DataFrame({'difference': observed, 'p_value': (extreme + 1) / (n_permutations + 1)}, index=statistics)
+
+
+def _months(df, months):
+    return df if months is None else df[df['month'].isin(months)]
+
+
+def cohort_table(df, months=None):
+    '''
+    This function returns the cohort statistics table for the given months (e.g. ['february'], or all of them).
+    '''
+    stats = CohortStats()
+    for _, month_df in _months(df, months).groupby('month', observed=True):
+        stats.add(month_df)
+    return stats.table()
+
+
+def compare_cohorts(df, months=None, n_permutations=200, max_values=50_000, seed=None):
+    '''
+    This function runs the permutation test on the trip durations (in minutes) once for every pair of user types
+    in the given months, and returns one row per pair with the differences in mean and std, and their p-values.
+    '''
+    df = _months(df, months)
+    user_type = df['user_type'].astype(str).to_numpy()
+    duration = df['duration_sec'].to_numpy(dtype=float) / 60
+    names = sorted(pd.unique(user_type))
+
+    rows = {}
+    for i, first in enumerate(names):
+        for second in names[i + 1:]:
+            tests = permutation_test(duration[user_type == first], duration[user_type == second]
+                                     , n_permutations=n_permutations, max_values=max_values, seed=seed)
+            rows[(first, second)] = {
+                'mean_diff_min': tests.loc['mean', 'difference'], 'mean_p_value': tests.loc['mean', 'p_value'],
+                'std_diff_min': tests.loc['std', 'difference'], 'std_p_value': tests.loc['std', 'p_value'],
+            }
+    columns = ['mean_diff_min', 'mean_p_value', 'std_diff_min', 'std_p_value']
+    index = pd.MultiIndex.from_tuples(list(rows), names=['user_type', 'compared_to'])
+    return pd.DataFrame(list(rows.values()), index=index, columns=columns)
@@ -0,0 +1,102 @@
+'''
+Hourly demand forecast for the Baywheels stations.
+
+The model is trained on hourly trip counts (one column per station and user_type), not on the raw trips.
+Every column gets a seasonal baseline (its average count for each of the 168 weekday / hour slots)
+, and a ridge regression on what the baseline misses: the same hour yesterday, the same hour last week and a trend.
+Since both lags are already known for the next 24 hours, all the columns are scored for the next day in one batch.
+'''
+import numpy as np
+import pandas as pd
+
+SLOTS = 7 * 24 # One seasonal slot per weekday and hour
+MAX_HORIZON = 24
+HOUR = pd.offsets.Hour()
+
+
+def hourly_counts(df, by='start_station_id'):
+    '''
+    This function takes the trip dataframe and returns the number of trips started every hour
+    , one row per hour (hours without any trip included as zeros), and one column per (by, user_type) pair.
+    With by=None the columns are only the user types, i.e. the system level demand.
+    '''
+    hour = pd.to_datetime(df['start_time']).dt.floor(HOUR).rename('hour')
+    keys = [hour] + ([df[by]] if by is not None else []) + [df['user_type']]
+    counts = df.groupby(keys, observed=True).size()
+    counts = counts.unstack(list(range(1, counts.index.nlevels)), fill_value=0)
+    hours = pd.date_range(counts.index.min(), counts.index.max(), freq=HOUR, name='hour')
+    return counts.reindex(hours, fill_value=0)
+
+
+def _slots(times):
+    return np.asarray(times.dayofweek * 24 + times.hour)
+
+
+def _design(lag_24, lag_168, trend):
+    # Rows x columns x features: intercept, residual 24 hours ago, residual a week ago, (standardised) trend
+    ones = np.ones_like(lag_24)
+    return np.stack([ones, lag_24, lag_168, np.broadcast_to(trend[:, None], lag_24.shape)], axis=-1)
+
+
+class DemandForecast:
+    '''
+    Seasonal baseline plus ridge regression on the hourly counts from hourly_counts(), e.g.
+
+        model = DemandForecast(alpha=1.0).fit(hourly_counts(wrangled_df))
+        model.predict() # Next 24 hours, for every station and user type
+    '''
+
+    def __init__(self, alpha=1.0):
+        self.alpha = alpha
+
+    def fit(self, counts):
+        '''
+        This method fits the baselines and the regressions of all the columns at once, and returns the model itself.
+        It needs at least two weeks of hours, since the first week only serves as the lags of the second.
+        '''
+        y = counts.to_numpy(dtype=float)
+        n_hours = len(y)
+        if n_hours <= 2 * SLOTS:
+            raise ValueError(f'At least {2 * SLOTS + 1} hours of counts are needed, got {n_hours}')
+        slots = _slots(counts.index)
+
+        # Seasonal baseline: mean count of every (weekday, hour) slot, for every column
+        totals = np.zeros((SLOTS, y.shape[1]))
+        np.add.at(totals, slots, y)
+        self.baseline_ = totals / np.maximum(np.bincount(slots, minlength=SLOTS), 1)[:, None]
+        residual = y - self.baseline_[slots]
+
+        # One ridge regression per column, solved together as a batch of small (features x features) systems
+        rows = np.arange(SLOTS, n_hours)
+        self.trend_scale_ = (rows.mean(), rows.std())
+        X = _design(residual[rows - 24], residual[rows - SLOTS], self._trend(rows)).transpose(1, 0, 2)
+        target = residual[rows].T
+        # The lags are counts like the target, and the trend is standardised, so one alpha fits all of them
+        # , but the intercept is left out of the penalty (shrinking it would just bias every prediction)
+        penalty = self.alpha * np.eye(X.shape[-1])
+        penalty[0, 0] = 0
+        gram = np.einsum('knp,knq->kpq', X, X) + penalty
+        self.coef_ = np.linalg.solve(gram, np.einsum('knp,kn->kp', X, target)[..., None])[..., 0]
+
+        self.columns_ = counts.columns
+        self.last_hour_ = counts.index[-1]
+        self.n_hours_ = n_hours
+        self.history_ = residual[-SLOTS:] # Enough residuals to look up the lags of the next 24 hours
+        return self
+
+    def _trend(self, rows):
+        center, scale = self.trend_scale_
+        return (rows - center) / max(scale, 1)
+
+    def predict(self, horizon=MAX_HORIZON):
+        '''
+        This method returns the expected number of trips for the next hours after the training data
+        , one row per hour and the same columns as the training counts.
+        '''
+        if not 1 <= horizon <= MAX_HORIZON:
+            raise ValueError(f'horizon must be between 1 and {MAX_HORIZON} hours, got {horizon}')
+        hours = pd.date_range(self.last_hour_ + pd.Timedelta(hours=1), periods=horizon, freq=HOUR, name='hour')
+        ahead = np.arange(horizon)
+        X = _design(self.history_[SLOTS - 24 + ahead], self.history_[ahead], self._trend(self.n_hours_ + ahead))
+        prediction = self.baseline_[_slots(hours)] + np.einsum('hkp,kp->hk', X, self.coef_)
+        return pd.DataFrame(np.clip(prediction, 0, None), index=hours, columns=self.columns_)
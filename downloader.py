@@ -0,0 +1,184 @@
+'''
+Concurrent downloads of the Baywheels monthly trip data into a local mirror folder.
+
+Each file is streamed to disk (never held in memory) as <name>.part, and an interrupted download is resumed
+with an HTTP Range request instead of starting over. Finished files are checked against their SHA-256 checksum
+and listed in the mirror's SHA256SUMS file, so later runs reuse them without fetching anything again.
+The downloads run concurrently through asyncio, on a bounded pool of connections.
+'''
+import asyncio
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE_URL = 'https://s3.amazonaws.com/baywheels-data'
+MIRROR = 'data_mirror'
+MANIFEST = 'SHA256SUMS'
+CHUNK_SIZE = 1 << 20
+
+
+def month_url(month, year=2020, base_url=BASE_URL):
+    '''
+    This function returns the URL of the zipped trip data file for the given month (e.g. '02') and year.
+    '''
+    return f'{base_url}/{year}{month}-baywheels-tripdata.csv.zip'
+
+
+def sha256sum(path):
+    '''
+    This function returns the SHA-256 hex digest of a file, reading it in chunks.
+    '''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_manifest(mirror):
+    '''
+    This function returns the {file name: checksum} dictionary recorded in the mirror's SHA256SUMS file.
+    '''
+    checksums = {}
+    try:
+        with open(os.path.join(mirror, MANIFEST)) as f:
+            for line in f:
+                if line.strip():
+                    checksum, name = line.split(None, 1)
+                    checksums[name.strip()] = checksum
+    except FileNotFoundError:
+        pass
+    return checksums
+
+
+def write_manifest(mirror, checksums):
+    '''
+    This function writes the {file name: checksum} dictionary as the mirror's SHA256SUMS file (same format as sha256sum).
+    '''
+    with open(os.path.join(mirror, MANIFEST + '.tmp'), 'w') as f:
+        f.writelines(f'{checksum}  {name}\n' for name, checksum in sorted(checksums.items()))
+    os.replace(os.path.join(mirror, MANIFEST + '.tmp'), os.path.join(mirror, MANIFEST))
+
+
+def remote_size(response):
+    '''
+    This function returns the full size of the remote file as announced by the response
+    , from Content-Range ("bytes 0-99/1234" or "bytes */1234") or from the Content-Length of a plain 200
+    , or None when the server doesn't say.
+    '''
+    content_range = response.headers.get('Content-Range', '')
+    if '/' in content_range:
+        total = content_range.rsplit('/', 1)[1].strip()
+        return int(total) if total.isdigit() else None
+    if response.status_code == 200 and 'Content-Length' in response.headers \
+            and not response.headers.get('Content-Encoding'):
+        return int(response.headers['Content-Length'])
+    return None
+
+
+def download(session, url, path, expected=None, retries=3, timeout=60):
+    '''
+    This function downloads url into path, resuming from path + '.part' if an earlier attempt was interrupted.
+    A file already in place is kept as long as it matches the expected checksum (when there is one).
+    The part file only becomes the final file once its size matches the size announced by the server.
+    It retries connection errors, timeouts, server errors and incomplete transfers, and returns the file's checksum.
+    '''
+    if os.path.exists(path):
+        checksum = sha256sum(path)
+        if expected is None or checksum == expected:
+            return checksum
+        os.remove(path) # Corrupted or outdated copy, fetching it again
+
+    part = path + '.part'
+    for attempt in range(retries + 1):
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                size = remote_size(response)
+                if response.status_code == 416:
+                    # Nothing past offset: the part file is complete only if it is exactly the remote size
+                    if size == offset:
+                        break
+                    os.remove(part)
+                    continue
+                response.raise_for_status()
+                # 206 means the server honoured the range, a plain 200 sends the whole file again
+                with open(part, 'ab' if response.status_code == 206 else 'wb') as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError,
+                requests.exceptions.ChunkedEncodingError) as error:
+            response = getattr(error, 'response', None)
+            if attempt == retries or (response is not None and response.status_code < 500):
+                raise
+            time.sleep(2 ** attempt)
+            continue
+
+        received = os.path.getsize(part)
+        if size is None or received == size:
+            break
+        if received > size:
+            os.remove(part) # Longer than the remote file, starting over
+    else:
+        raise OSError(f'Could not get all of {url} in {retries + 1} attempts')
+
+    checksum = sha256sum(part)
+    if expected is not None and checksum != expected:
+        os.remove(part)
+        raise ValueError(f'Checksum mismatch for {url}: expected {expected}, got {checksum}')
+    os.replace(part, path)
+    return checksum
+
+
+async def fetch_all(urls, mirror=MIRROR, connections=4, checksums=None, **download_kwargs):
+    '''
+    This coroutine downloads all the urls into the mirror folder, at most connections of them at a time
+    , and returns the local paths in the same order.
+    Expected checksums can be given as {file name: checksum}, otherwise the ones in SHA256SUMS are used.
+    '''
+    os.makedirs(mirror, exist_ok=True)
+    known = read_manifest(mirror)
+    known.update(checksums or {})
+    names = [os.path.basename(urlparse(url).path) for url in urls]
+    paths = [os.path.join(mirror, name) for name in names]
+
+    loop = asyncio.get_running_loop()
+    with requests.Session() as session, ThreadPoolExecutor(connections) as pool:
+        adapter = HTTPAdapter(pool_connections=connections, pool_maxsize=connections)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        results = await asyncio.gather(*(
+            loop.run_in_executor(pool, lambda url=url, path=path, name=name: download(
+                session, url, path, expected=known.get(name), **download_kwargs))
+            for url, path, name in zip(urls, paths, names)
+        ), return_exceptions=True)
+
+    # Recording whatever succeeded before reporting any failure, so it is not fetched again
+    manifest = read_manifest(mirror)
+    manifest.update({name: result for name, result in zip(names, results) if isinstance(result, str)})
+    write_manifest(mirror, manifest)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return paths
+
+
+def fetch_months(months, year=2020, mirror=MIRROR, connections=4, **kwargs):
+    '''
+    This function downloads the trip data zip files of the given months (e.g. ['02', '03']) into the mirror folder
+    , and returns their local paths. It can be called from a script as well as from inside a running notebook.
+    '''
+    coroutine = fetch_all([month_url(month, year) for month in months], mirror, connections, **kwargs)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    # Jupyter already runs an event loop in this thread, so the downloads get their own
+    with ThreadPoolExecutor(1) as runner:
+        return runner.submit(asyncio.run, coroutine).result()
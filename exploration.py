@@ -57,6 +57,13 @@ import zipfile
 import requests
 import io
 
+# local helpers
+from downloader import fetch_months
+from trip_table import read_trip_table
+from trip_flags import flag_trips, flag_counts, valid_trips
+from trip_sample import TripSample
+from cohort_stats import cohort_table, compare_cohorts
+
 get_ipython().run_line_magic('matplotlib', 'inline')
 
 
@@ -69,17 +76,23 @@ get_ipython().run_line_magic('matplotlib', 'inline')
 def fetch_csv(month, year = 2020):
     '''
     This function takes two inputs (month and year) "though I made the year constant since I won't change it later"
-    , uses request to get the required zip file, unzip the file, read the included CSV file
+    , gets the required zip file from the local mirror (downloading it first if it's not there yet), unzip the file, read the included CSV file
     , and finally, save the same in a datafile.
     '''
-    re = requests.get(f'https://s3.amazonaws.com/baywheels-data/{year}{month}-baywheels-tripdata.csv.zip')
-    zip_file = zipfile.ZipFile(io.BytesIO(re.content))
-    csv_file = zip_file.open(f'{year}{month}-baywheels-tripdata.csv')
-    
-    df = pd.read_csv(csv_file)
+    zip_path = fetch_months([month], year)[0]
+    with zipfile.ZipFile(zip_path) as zip_file:
+        csv_file = zip_file.open(f'{year}{month}-baywheels-tripdata.csv')
+        df = pd.read_csv(csv_file)
     df.to_csv(f'data{month}-{year}.csv',index=False)
 
 
+# In[ ]:
+
+
+# Downloading both months concurrently into the local mirror (data_mirror), fetch_csv then reuses the mirrored files
+fetch_months(['02', '03'])
+
+
 # In[3]:
 
 
@@ -261,6 +274,7 @@ df1.rental_access_method.value_counts()
 # ### Quality Findings
 #     Q1 Wrong datatypes ('start_time', 'end_time', 'start_station_id', 'end_station_id', ETC..)
 #     Q2 Missing data records
+#     Q3 Implausible trips (60 seconds at the same station, multi-day rentals, ETC..) are mixed in with the rest
 
 # ****
 
@@ -421,6 +435,29 @@ main_df['duration_hrs'] = main_df['duration_hrs'].astype(int)
 main_df.head()
 
 
+# ****
+# ### Q3 Implausible trips (60 seconds at the same station, multi-day rentals, ETC..) are mixed in with the rest
+# ### Define:
+# Adding a 'trip_flags' bitmask column instead of dropping them, one bit per reason: same station blip, multi-day rental, end before start, impossible speed between the stations, and duration outlier within its (user_type, start_hour) group.
+# <br>**Note:** This is done before T6 since the speed check needs the station coordinates.
+# ### Code:
+
+# In[ ]:
+
+
+main_df['trip_flags'] = flag_trips(main_df)
+
+
+# ### Testing:
+
+# In[ ]:
+
+
+# Number of trips carrying each flag, and the share of trips without any flag
+print(flag_counts(main_df.trip_flags))
+(main_df.trip_flags == 0).mean()
+
+
 # ****
 # ### T6 There are several columns that are not required for the analysis.
 # ### Define:
@@ -534,7 +571,8 @@ main_df.to_csv('wrangled_baywheels_2020.csv', index=False)
 # In[45]:
 
 
-wrangled_df = pd.read_csv('wrangled_baywheels_2020.csv', dtype={'rental_access_method': object})
+# Loading through the memory-mapped columnar cache, the CSV file is only parsed again when it changes
+wrangled_df = read_trip_table('wrangled_baywheels_2020.csv', dtype={'rental_access_method': object})
 wrangled_df.head()
 
 
@@ -544,6 +582,20 @@ wrangled_df.head()
 wrangled_df.describe()
 
 
+# In[ ]:
+
+
+# Stratified sample (by month, day, hour and user_type) to iterate quickly on new charts, added month by month
+# , set EXACT = True to get the same estimates from all the trips instead
+EXACT = False
+trip_sample = TripSample(per_stratum=50, seed=42, exact=EXACT)
+for month, month_df in wrangled_df.groupby('month', observed=True):
+    trip_sample.add(month_df)
+
+# Estimated mean trip duration of each user type, with its standard error (EXACT = True gives the true means)
+trip_sample.mean('duration_min', by='user_type')
+
+
 # In[47]:
 
 
@@ -728,15 +780,30 @@ plt.grid()
 # Customer Usage by Duration vs. Subscriber Usage by Duration
 
 plt.figure(figsize=(15, 8))
-data = wrangled_df.query('duration_min <= 60')
+data = valid_trips(wrangled_df) # Leaving out the trips flagged during cleaning (Q3)
 
 sb.violinplot(data=data, x='user_type', y='duration_min', color = base_color)
+plt.ylim(0, 60) # Zooming in on the first hour, where nearly all the trips are (display only)
 
 plt.title('Baywheels System - Customers vs. Subscribers Ride Duration in Minutes', y=1.05, fontsize=16, fontweight='bold')
 plt.xlabel('User Type', fontsize=14, fontweight='bold')
 plt.ylabel('Duration in Minutes', fontsize=14, fontweight='bold');
 
 
+# In[ ]:
+
+
+# Duration statistics and demand peaks per user type, computed from the trip table
+cohort_table(valid_trips(wrangled_df))
+
+
+# In[ ]:
+
+
+# Permutation tests on the mean and spread of trip durations, once per pair of user types
+compare_cohorts(valid_trips(wrangled_df), seed=42)
+
+
 # **Observation 3:** The plots above show the ride duration spread in minutes.
 # <br>Both `customers and subscribers` have used the Bike sharing system almost *`equal`* in duration, less than or equal to 60 minutes.
 # ****
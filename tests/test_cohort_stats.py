@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from cohort_stats import CohortStats, compare_cohorts, permutation_test
+
+
+def trips(rows, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'duration_sec': rng.integers(60, 5000, rows),
+        'start_time': pd.Timestamp('2020-02-01') + pd.to_timedelta(rng.integers(0, 60 * 86400, rows), unit='s'),
+        'user_type': rng.choice(['Customer', 'Subscriber'], rows),
+    })
+
+
+def test_batches_merge_to_the_one_shot_statistics():
+    batches = [trips(rows, seed) for seed, rows in enumerate([5000, 1, 300, 2000])]
+    stats = CohortStats()
+    for batch in batches:
+        stats.add(batch)
+    table = stats.table()
+    everything = pd.concat(batches, ignore_index=True)
+
+    for user_type, group in everything.groupby('user_type'):
+        seconds = group['duration_sec'].to_numpy()
+        row = table.loc[user_type]
+        assert row['trips'] == len(seconds)
+        np.testing.assert_allclose(row['mean_min'], seconds.mean() / 60)
+        np.testing.assert_allclose(row['std_min'], seconds.std(ddof=1) / 60)
+        assert (row['min_min'], row['max_min']) == (seconds.min() / 60, seconds.max() / 60)
+        q = [0.25, 0.5, 0.75, 0.9]
+        np.testing.assert_array_equal(stats.quantiles(user_type, q), np.quantile(seconds, q, method='lower'))
+        profile = pd.crosstab(group['start_time'].dt.dayofweek, group['start_time'].dt.hour)
+        profile = profile.reindex(index=range(7), columns=range(24), fill_value=0)
+        np.testing.assert_array_equal(stats.profile(user_type), profile)
+
+
+def test_permutation_test_needs_two_values_on_each_side():
+    for a, b in [([], [1.0, 2.0]), ([1.0], [1.0, 2.0, 3.0]), ([1.0, 2.0], [5.0])]:
+        result = permutation_test(a, b, seed=0)
+        assert result.index.tolist() == ['mean', 'std']
+        assert result.isna().all().all()
+
+
+def test_permutation_test_tells_different_samples_apart():
+    rng = np.random.default_rng(0)
+    same = permutation_test(rng.normal(0, 1, 500), rng.normal(0, 1, 500), seed=0)
+    apart = permutation_test(rng.normal(0, 1, 500), rng.normal(1, 3, 500), seed=0)
+    assert (same['p_value'] > 0.01).all()
+    assert (apart['p_value'] < 0.01).all()
+
+
+def test_compare_cohorts_needs_two_user_types():
+    df = trips(1000, 0).assign(user_type='Subscriber')
+    result = compare_cohorts(df, seed=0)
+    assert result.empty
+    assert result.columns.tolist() == ['mean_diff_min', 'mean_p_value', 'std_diff_min', 'std_p_value']
+
+    both = compare_cohorts(trips(1000, 0), seed=0)
+    assert both.index.tolist() == [('Customer', 'Subscriber')]
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from demand_forecast import MAX_HORIZON, SLOTS, DemandForecast
+
+WEEKS = 6
+
+
+def periodic_counts(extra_hours=MAX_HORIZON, growth=0.0):
+    # Weekly pattern (busier commute hours on weekdays), optionally growing by `growth` trips per day
+    hours = pd.date_range('2020-02-03', periods=WEEKS * SLOTS + extra_hours, freq='h', name='hour')
+    rng = np.random.default_rng(0)
+    pattern = rng.integers(0, 40, SLOTS).astype(float)
+    slot = hours.dayofweek * 24 + hours.hour
+    days = np.arange(len(hours)) / 24
+    return pd.DataFrame({('1', 'Subscriber'): pattern[slot], ('1', 'Customer'): pattern[slot] / 4 + growth * days},
+                        index=hours)
+
+
+@pytest.mark.parametrize('growth', [0.0, 0.5])
+def test_forecast_recovers_the_next_day(growth):
+    counts = periodic_counts(growth=growth)
+    history, known = counts.iloc[:-MAX_HORIZON], counts.iloc[-MAX_HORIZON:]
+    forecast = DemandForecast(alpha=1.0).fit(history).predict()
+
+    pd.testing.assert_index_equal(forecast.index, known.index)
+    pd.testing.assert_index_equal(forecast.columns, known.columns)
+    np.testing.assert_allclose(forecast, known, atol=0.05)
+    assert len(DemandForecast().fit(history).predict(6)) == 6
+
+
+def test_intercept_is_not_shrunk():
+    # A busier first week lifts the seasonal baseline, so every later residual sits at the same offset
+    # , which only the intercept can take back, however strong the penalty on the other features
+    counts = periodic_counts()
+    counts.iloc[:SLOTS] += 12
+    history, known = counts.iloc[:-MAX_HORIZON], counts.iloc[-MAX_HORIZON:]
+    forecast = DemandForecast(alpha=1e4).fit(history).predict()
+    np.testing.assert_allclose(forecast, known, atol=0.05)
+
+
+def test_errors():
+    with pytest.raises(ValueError, match='At least'):
+        DemandForecast().fit(periodic_counts().iloc[:2 * SLOTS])
+    model = DemandForecast().fit(periodic_counts())
+    for horizon in [0, MAX_HORIZON + 1]:
+        with pytest.raises(ValueError, match='horizon'):
+            model.predict(horizon)
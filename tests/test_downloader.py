@@ -0,0 +1,116 @@
+import asyncio
+import hashlib
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import downloader
+
+PAYLOAD = os.urandom(5 * 1024 * 1024)
+CUT_AT = 2 * 1024 * 1024
+NAME = '202002-baywheels-tripdata.csv.zip'
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    '''
+    Local stand-in for the S3 bucket, with Range support. While server.cut is set, the next full
+    (non-range) download is cut off after CUT_AT bytes, like a dropped connection.
+    '''
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.headers.get('Range'))
+        match = re.fullmatch(r'bytes=(\d+)-', self.headers.get('Range') or '')
+        start = int(match.group(1)) if match else 0
+
+        if start >= len(PAYLOAD):
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{len(PAYLOAD)}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        body = PAYLOAD[start:]
+        self.send_response(206 if match else 200)
+        if match:
+            self.send_header('Content-Range', f'bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if server.cut and not match:
+            server.cut = False
+            self.wfile.write(body[:CUT_AT])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    httpd.requests, httpd.cut = [], False
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def no_pause(monkeypatch):
+    monkeypatch.setattr(downloader.time, 'sleep', lambda seconds: None)
+
+
+def fetch(server, mirror, **kwargs):
+    url = f'http://127.0.0.1:{server.server_address[1]}/{NAME}'
+    return asyncio.run(downloader.fetch_all([url], mirror=str(mirror), **kwargs))
+
+
+def test_resumes_cut_download_and_reuses_the_mirror(server, tmp_path):
+    server.cut = True
+    [path] = fetch(server, tmp_path)
+
+    assert server.requests == [None, f'bytes={CUT_AT}-']
+    with open(path, 'rb') as f:
+        assert f.read() == PAYLOAD
+    assert downloader.read_manifest(str(tmp_path)) == {NAME: hashlib.sha256(PAYLOAD).hexdigest()}
+    assert not os.path.exists(path + '.part')
+
+    fetch(server, tmp_path)
+    assert len(server.requests) == 2
+
+
+def test_checksum_mismatch_is_rejected(server, tmp_path):
+    with pytest.raises(ValueError, match='Checksum mismatch'):
+        fetch(server, tmp_path, checksums={NAME: '0' * 64})
+
+    assert not os.path.exists(tmp_path / NAME)
+    assert not os.path.exists(tmp_path / (NAME + '.part'))
+    assert NAME not in downloader.read_manifest(str(tmp_path))
+
+
+def test_part_file_longer_than_remote_file_starts_over(server, tmp_path):
+    with open(tmp_path / (NAME + '.part'), 'wb') as f:
+        f.write(PAYLOAD + b'garbage')
+    [path] = fetch(server, tmp_path)
+
+    assert server.requests == [f'bytes={len(PAYLOAD) + 7}-', None]
+    with open(path, 'rb') as f:
+        assert f.read() == PAYLOAD
+    assert downloader.read_manifest(str(tmp_path)) == {NAME: hashlib.sha256(PAYLOAD).hexdigest()}
+
+
+def test_complete_part_file_is_promoted(server, tmp_path):
+    with open(tmp_path / (NAME + '.part'), 'wb') as f:
+        f.write(PAYLOAD)
+    [path] = fetch(server, tmp_path)
+
+    assert server.requests == [f'bytes={len(PAYLOAD)}-']
+    with open(path, 'rb') as f:
+        assert f.read() == PAYLOAD
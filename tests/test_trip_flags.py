@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+import trip_flags
+from trip_flags import (DURATION_OUTLIER, END_BEFORE_START, IMPOSSIBLE_SPEED, MULTI_DAY, SAME_STATION_BLIP,
+                        flag_trips, group_quartiles, valid_trips)
+
+KM_LATITUDE = 1 / 111.195 # Degrees of latitude in a kilometer
+
+
+def trip(duration_sec, start_station, end_station, km=1.0, user_type='Subscriber', hour=8, end_offset_sec=None):
+    start = pd.Timestamp('2020-02-03') + pd.Timedelta(hours=hour)
+    end = start + pd.Timedelta(seconds=duration_sec if end_offset_sec is None else end_offset_sec)
+    return {
+        'duration_sec': duration_sec, 'start_time': start, 'end_time': end,
+        'start_station_id': start_station, 'end_station_id': end_station,
+        'start_station_latitude': 37.77, 'start_station_longitude': -122.42,
+        'end_station_latitude': 37.77 + km * KM_LATITUDE, 'end_station_longitude': -122.42,
+        'user_type': user_type, 'start_hour': hour,
+    }
+
+
+def test_one_trip_per_flag():
+    # 40 ordinary rides make up the (Subscriber, 8h) group, every odd trip gets a (Customer, hour) group of its own
+    usual = [trip(duration, 1, 2) for duration in np.linspace(600, 900, 40)]
+    odd = {
+        SAME_STATION_BLIP: trip(60, 3, 3, km=0, user_type='Customer', hour=1),
+        MULTI_DAY: trip(2 * 86400, 1, 2, user_type='Customer', hour=2),
+        END_BEFORE_START: trip(600, 1, 2, user_type='Customer', hour=3, end_offset_sec=-600),
+        IMPOSSIBLE_SPEED: trip(120, 1, 4, km=10, user_type='Customer', hour=4),
+        DURATION_OUTLIER: trip(20000, 1, 2),
+    }
+    df = pd.DataFrame(usual + list(odd.values()))
+    df['trip_flags'] = flag_trips(df)
+
+    assert df['trip_flags'].dtype == np.uint8
+    assert (df['trip_flags'][:len(usual)] == 0).all()
+    assert df['trip_flags'][len(usual):].tolist() == list(odd)
+
+    assert len(valid_trips(df)) == len(usual)
+    kept = valid_trips(df, ignore=MULTI_DAY | DURATION_OUTLIER)
+    assert kept['duration_sec'].tolist()[len(usual):] == [2 * 86400, 20000]
+    assert trip_flags.flag_counts(df['trip_flags']).tolist() == [1] * len(odd)
+
+
+def test_speed_check_is_skipped_without_coordinates():
+    df = pd.DataFrame([trip(120, 1, 4, km=10)]).drop(columns=['start_station_latitude', 'end_station_latitude'])
+    assert flag_trips(df).tolist() == [0]
+
+
+def test_group_quartiles_match_lower_quantiles():
+    rng = np.random.default_rng(0)
+    keys = rng.integers(0, 30, 5000)
+    values = rng.lognormal(6, 1, 5000)
+    aligned = group_quartiles(keys, values)
+
+    for key in np.unique(keys):
+        group = keys == key
+        for q, found in zip([0.25, 0.5, 0.75], aligned):
+            assert (found[group] == np.quantile(values[group], q, method='lower')).all()
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from trip_sample import TripSample
+
+
+def monthly_trips(month, rows, seed):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(f'2020-{month:02d}-01') + pd.to_timedelta(rng.integers(0, 28 * 86400, rows), unit='s')
+    return pd.DataFrame({
+        'start_time': start,
+        'user_type': rng.choice(['Customer', 'Subscriber'], rows, p=[0.3, 0.7]),
+        'start_station_id': rng.integers(1, 20, rows),
+        'duration_min': rng.lognormal(2.3, 0.6, rows),
+    })
+
+
+@pytest.fixture
+def months():
+    return [monthly_trips(2, 6000, 0), monthly_trips(3, 4000, 1)]
+
+
+def test_exact_sample_reproduces_the_full_groupby(months):
+    trip_sample = TripSample(seed=0, exact=True)
+    for month_df in months:
+        trip_sample.add(month_df)
+    trips = pd.concat(months, ignore_index=True)
+
+    counts = trip_sample.count('start_station_id')
+    expected = trips.groupby('start_station_id').size()
+    np.testing.assert_allclose(counts['estimate'], expected.reindex(counts.index))
+    assert (counts['std_error'] == 0).all()
+
+    means = trip_sample.mean('duration_min', by='user_type')
+    expected = trips.groupby('user_type')['duration_min'].mean()
+    np.testing.assert_allclose(means['estimate'], expected.reindex(means.index))
+    np.testing.assert_allclose(means['std_error'], 0, atol=1e-9)
+
+
+@pytest.mark.parametrize('exact', [False, True])
+def test_sample_weights_add_up_to_the_trips_added(months, exact):
+    trip_sample = TripSample(per_stratum=5, seed=0, exact=exact)
+    for month_df in months:
+        trip_sample.add(month_df)
+
+    assert trip_sample.frame['sample_weight'].sum() == pytest.approx(sum(len(month_df) for month_df in months))
+    assert len(trip_sample) == 10_000 if exact else len(trip_sample) < 10_000
@@ -0,0 +1,123 @@
+import os
+import subprocess
+import sys
+import textwrap
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import trip_table
+
+ROWS = 2_000
+
+
+def wrangled_csv(path, seed=0):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2020-02-01') + pd.to_timedelta(rng.integers(0, 60 * 86400, ROWS), unit='s')
+    duration = rng.integers(60, 7200, ROWS)
+    access = rng.choice(np.array(['app', 'clipper', None], dtype=object), ROWS)
+    pd.DataFrame({
+        'duration_sec': duration,
+        'start_time': start,
+        'end_time': start + pd.to_timedelta(duration, unit='s'),
+        'start_station_id': rng.integers(1, 400, ROWS).astype(float),
+        'user_type': rng.choice(['Customer', 'Subscriber'], ROWS),
+        'rental_access_method': access,
+        'month': start.month_name().str.lower(),
+    }).to_csv(path, index=False)
+    return path
+
+
+def as_objects(series):
+    return series.astype(object).where(series.notna(), None)
+
+
+def test_cache_round_trip_matches_read_csv(tmp_path):
+    csv_path = wrangled_csv(tmp_path / 'wrangled.csv')
+    expected = pd.read_csv(csv_path, parse_dates=trip_table.DATE_COLUMNS, dtype={'rental_access_method': object})
+    loaded = trip_table.read_trip_table(str(csv_path), dtype={'rental_access_method': object})
+
+    assert list(loaded.columns) == list(expected.columns)
+    assert loaded['rental_access_method'].isna().sum() == expected['rental_access_method'].isna().sum() > 0
+    for name in ['start_time', 'end_time']:
+        assert loaded[name].dtype == 'datetime64[ns]'
+        assert (loaded[name] == expected[name]).all()
+    for name in ['duration_sec', 'start_station_id']:
+        assert loaded[name].dtype == expected[name].dtype
+        np.testing.assert_array_equal(loaded[name], expected[name]) # The loaded ones are np.memmap views
+    for name in ['user_type', 'rental_access_method', 'month']:
+        assert isinstance(loaded[name].dtype, pd.CategoricalDtype)
+        pd.testing.assert_series_equal(as_objects(loaded[name]), as_objects(expected[name]))
+
+
+def test_cache_is_stale_after_csv_or_options_change(tmp_path):
+    csv_path = wrangled_csv(tmp_path / 'wrangled.csv')
+    cache_dir = str(tmp_path / 'wrangled.cache')
+    options = {'parse_dates': trip_table.DATE_COLUMNS}
+    trip_table.read_trip_table(str(csv_path))
+    assert trip_table.cache_is_fresh(cache_dir, csv_path, options)
+
+    assert not trip_table.cache_is_fresh(cache_dir, csv_path, dict(options, dtype={'rental_access_method': object}))
+
+    wrangled_csv(csv_path, seed=1)
+    stat = os.stat(csv_path)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert not trip_table.cache_is_fresh(cache_dir, csv_path, options)
+    assert trip_table.read_trip_table(str(csv_path))['duration_sec'].equals(pd.read_csv(csv_path)['duration_sec'])
+
+
+def test_rebuild_keeps_older_frames_readable(tmp_path):
+    # In a separate process, since touching a truncated memory map kills the interpreter (bus error)
+    csv_path = wrangled_csv(tmp_path / 'wrangled.csv')
+    script = textwrap.dedent(f'''
+        import os
+        import pandas as pd
+        import trip_table
+
+        old = trip_table.read_trip_table({str(csv_path)!r})
+        expected = pd.read_csv({str(csv_path)!r})['duration_sec'].sum()
+        pd.DataFrame({{'duration_sec': [1, 2]}}).to_csv({str(csv_path)!r}, index=False)
+        os.utime({str(csv_path)!r}, (0, 0))
+        new = trip_table.read_trip_table({str(csv_path)!r}, parse_dates=None)
+        assert new['duration_sec'].sum() == 3
+        assert old['duration_sec'].sum() == expected
+        assert old['start_time'].notna().all()
+    ''')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', script], cwd=root, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert len(os.listdir(tmp_path / 'wrangled.cache')) == 2 # header.json and the new build's column, nothing older
+
+
+def worker_columns(names):
+    table = trip_table.worker_trip_table()
+    found = {}
+    for name in names:
+        column = table[name]
+        backing = column.codes if isinstance(column, pd.Categorical) else column
+        found[name] = (pd.Series(column, name=name), backing.flags.writeable)
+    return found
+
+
+def test_pool_workers_read_the_shared_table(tmp_path):
+    df = pd.read_csv(wrangled_csv(tmp_path / 'wrangled.csv'), parse_dates=trip_table.DATE_COLUMNS)
+    df['user_type'] = df['user_type'].astype('category')
+    shm, layout = trip_table.share_trip_table(df)
+    try:
+        with Pool(2, initializer=trip_table.init_worker, initargs=(layout,)) as pool:
+            found = pool.map(worker_columns, [['duration_sec', 'start_time'], ['user_type', 'rental_access_method']])
+    finally:
+        shm.close()
+        shm.unlink()
+
+    with pytest.raises(FileNotFoundError): # The workers let go of the block, so the owner could remove it
+        shared_memory.SharedMemory(name=layout['name'])
+
+    columns = {name: values for result in found for name, values in result.items()}
+    assert not any(writeable for _, writeable in columns.values())
+    for name in ['duration_sec', 'start_time']:
+        np.testing.assert_array_equal(columns[name][0], df[name])
+    for name in ['user_type', 'rental_access_method']:
+        pd.testing.assert_series_equal(as_objects(columns[name][0]), as_objects(df[name]))
@@ -0,0 +1,111 @@
+'''
+Flagging of implausible Baywheels trips.
+
+Instead of dropping trips (or truncating the plots at some duration), every trip gets a small bitmask
+in a 'trip_flags' column, one bit per reason it looks wrong. A zero means the trip looks fine
+, so a plot only needs df[df.trip_flags == 0] (or valid_trips(df)) to leave them out.
+'''
+import numpy as np
+import pandas as pd
+
+# One bit per reason, so a trip can carry several of them at once
+SAME_STATION_BLIP = 1 # Returned to the same station almost right away (undocking and redocking the bike)
+MULTI_DAY = 2 # Rented for a day or more
+END_BEFORE_START = 4 # Ends before it starts, or has no positive duration
+IMPOSSIBLE_SPEED = 8 # Straight line distance between the stations can't be covered in that time
+DURATION_OUTLIER = 16 # Far outside the usual durations of its (user_type, start_hour) group
+
+FLAG_NAMES = {
+    SAME_STATION_BLIP: 'same_station_blip',
+    MULTI_DAY: 'multi_day',
+    END_BEFORE_START: 'end_before_start',
+    IMPOSSIBLE_SPEED: 'impossible_speed',
+    DURATION_OUTLIER: 'duration_outlier',
+}
+
+BLIP_MAX_SEC = 120
+MULTI_DAY_SEC = 24 * 3600
+MAX_SPEED_KMH = 45 # e-bikes are capped at about 30 km/h, this leaves room for GPS / station coordinate errors
+OUTLIER_IQR_FACTOR = 3 # Tukey's "far out" fences, applied to log(duration)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    '''
+    This function returns the great circle distance in kilometers between two (arrays of) coordinates.
+    '''
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=float)) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * np.arcsin(np.sqrt(a))
+
+
+def group_quartiles(keys, values):
+    '''
+    This function takes integer group keys and values of the same length
+    , and returns the first quartile, median and third quartile of every trip's own group, aligned with the input.
+    It only sorts the data once (by key, then value) and reads the quartiles by position.
+    '''
+    order = np.lexsort((values, keys))
+    sorted_keys, sorted_values = keys[order], values[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    counts = np.diff(np.r_[starts, len(sorted_keys)])
+
+    quartiles = [sorted_values[starts + np.floor(q * (counts - 1)).astype(np.int64)] for q in (0.25, 0.5, 0.75)]
+    group_of_trip = np.repeat(np.arange(len(starts)), counts)
+
+    aligned = []
+    for per_group in quartiles:
+        result = np.empty(len(values))
+        result[order] = per_group[group_of_trip]
+        aligned.append(result)
+    return aligned
+
+
+def flag_trips(df):
+    '''
+    This function takes the trip dataframe and returns a uint8 array with the flags of every trip.
+    It expects 'duration_sec', 'start_time', 'end_time' (as datetimes), 'start_station_id', 'end_station_id'
+    , 'user_type' and 'start_hour'. The speed check also needs the station latitude / longitude columns
+    , so it has to run before those are dropped, and is skipped if they are not there.
+    '''
+    duration = df['duration_sec'].to_numpy(dtype=float)
+    flags = np.zeros(len(df), dtype=np.uint8)
+
+    same_station = (df['start_station_id'] == df['end_station_id']).to_numpy()
+    flags[same_station & (duration < BLIP_MAX_SEC)] |= SAME_STATION_BLIP
+    flags[duration >= MULTI_DAY_SEC] |= MULTI_DAY
+    flags[(df['end_time'] < df['start_time']).to_numpy() | (duration <= 0)] |= END_BEFORE_START
+
+    coordinates = ['start_station_latitude', 'start_station_longitude', 'end_station_latitude', 'end_station_longitude']
+    if all(column in df.columns for column in coordinates):
+        distance = haversine_km(*(df[column] for column in coordinates))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            speed = distance / (duration / 3600)
+        flags[(duration > 0) & (speed > MAX_SPEED_KMH)] |= IMPOSSIBLE_SPEED
+
+    # Robust per (user_type, start_hour) statistics, only over trips with a positive duration
+    positive = duration > 0
+    user_codes, _ = pd.factorize(df['user_type'])
+    keys = (user_codes.astype(np.int64) + 1) * 24 + df['start_hour'].to_numpy(dtype=np.int64)
+    log_duration = np.log(duration[positive])
+    q1, _, q3 = group_quartiles(keys[positive], log_duration)
+    fence = OUTLIER_IQR_FACTOR * (q3 - q1)
+    outlier = np.zeros(len(df), dtype=bool)
+    outlier[positive] = (log_duration < q1 - fence) | (log_duration > q3 + fence)
+    flags[outlier] |= DURATION_OUTLIER
+    return flags
+
+
+def flag_counts(flags):
+    '''
+    This function takes the flags column and returns how many trips carry each flag (as a pandas Series).
+    '''
+    flags = np.asarray(flags)
+    return pd.Series({name: int(np.count_nonzero(flags & bit)) for bit, name in FLAG_NAMES.items()})
+
+
+def valid_trips(df, ignore=0):
+    '''
+    This function returns the trips with no flags set, apart from the ones given in ignore
+    , e.g. valid_trips(df, ignore=DURATION_OUTLIER) keeps the unusually long (but possible) trips.
+    '''
+    return df[(df['trip_flags'].to_numpy(dtype=np.int64) & ~ignore) == 0]
@@ -0,0 +1,134 @@
+'''
+Stratified sample of the Baywheels trips for quick exploration.
+
+Trips are split into strata by (month, day of week, start hour, user_type), and up to per_stratum trips
+are kept for each of them. Every trip gets a random priority when it is added, and each stratum keeps its
+lowest priorities, which is a uniform reservoir sample that can be topped up month by month as the data arrives.
+The counts and means are then estimated from the sample with their standard errors
+, or computed exactly on all the trips when the sample is created with exact=True.
+'''
+import numpy as np
+import pandas as pd
+
+
+def stratum_keys(df, user_codes):
+    '''
+    This function returns one integer key per trip, combining the month, day of week and hour of 'start_time'
+    with the code of its 'user_type' (new user types are added to the user_codes dictionary as they show up).
+    It works on the raw monthly files as well as on the wrangled data.
+    '''
+    start = pd.to_datetime(df['start_time'])
+    user_type = df['user_type'].astype(str).to_numpy()
+    for value in pd.unique(user_type):
+        user_codes.setdefault(value, len(user_codes))
+    codes = pd.Series(user_type).map(user_codes).to_numpy(dtype=np.int64)
+    calendar = (start.dt.month.to_numpy(dtype=np.int64) * 7 + start.dt.dayofweek.to_numpy(dtype=np.int64)) * 24
+    return (calendar + start.dt.hour.to_numpy(dtype=np.int64)) * 1000 + codes
+
+
+class TripSample:
+    '''
+    Stratified reservoir sample of the trips, e.g.
+
+        trip_sample = TripSample(per_stratum=50, seed=42)
+        trip_sample.add(df1).add(df2)
+        trip_sample.count('start_station_id')
+        trip_sample.mean('duration_min', by='user_type')
+
+    With exact=True nothing is left out, so the same calls run on all the trips (with a zero standard error).
+    '''
+
+    def __init__(self, per_stratum=100, seed=None, exact=False):
+        self.per_stratum = per_stratum
+        self.exact = exact
+        self._rng = np.random.default_rng(seed)
+        self._user_codes = {}
+        self._population = pd.Series(dtype=np.int64)
+        self._sample = None
+
+    def add(self, df):
+        '''
+        This method adds a batch of trips (e.g. one month file) to the sample, and returns the sample itself.
+        '''
+        keys = stratum_keys(df, self._user_codes)
+        counts = pd.Series(keys).value_counts()
+        self._population = self._population.add(counts, fill_value=0).astype(np.int64)
+
+        candidates = df.assign(_stratum=keys, _priority=self._rng.random(len(df)))
+        if self._sample is not None:
+            candidates = pd.concat([self._sample, candidates], ignore_index=True)
+        if not self.exact:
+            candidates = candidates.sort_values(['_stratum', '_priority'])
+            candidates = candidates[candidates.groupby('_stratum').cumcount().to_numpy() < self.per_stratum]
+        self._sample = candidates.reset_index(drop=True)
+        return self
+
+    def _strata(self):
+        # Sample size n and population size N of every stratum, lined up with the sampled trips
+        n = self._sample.groupby('_stratum').size()
+        N = self._population.reindex(n.index)
+        return n, N
+
+    @property
+    def frame(self):
+        '''
+        The sampled trips, with a 'sample_weight' column telling how many trips each of them stands for.
+        '''
+        n, N = self._strata()
+        weight = (N / n).reindex(self._sample['_stratum']).to_numpy()
+        return self._sample.drop(columns=['_stratum', '_priority']).assign(sample_weight=weight)
+
+    def __len__(self):
+        return 0 if self._sample is None else len(self._sample)
+
+    def count(self, by):
+        '''
+        This method estimates the number of trips for every value of the by column(s)
+        , and returns a dataframe with the 'estimate' and its 'std_error'.
+        '''
+        by = [by] if isinstance(by, str) else list(by)
+        n, N = self._strata()
+        cells = self._sample.groupby(['_stratum'] + by, observed=True).size().rename('n_g').reset_index()
+        n_h, N_h = n.reindex(cells['_stratum']).to_numpy(), N.reindex(cells['_stratum']).to_numpy()
+
+        share = cells['n_g'].to_numpy() / n_h
+        cells['estimate'] = N_h * share
+        cells['variance'] = N_h ** 2 * (1 - n_h / N_h) * share * (1 - share) / np.maximum(n_h - 1, 1)
+
+        result = cells.groupby(by, observed=True)[['estimate', 'variance']].sum()
+        result['std_error'] = np.sqrt(result.pop('variance'))
+        return result
+
+    def mean(self, column, by=None):
+        '''
+        This method estimates the mean of a column, overall or for every value of the by column(s)
+        , and returns a dataframe with the 'estimate' and its (linearized) 'std_error'.
+        '''
+        sample = self._sample
+        by = [] if by is None else [by] if isinstance(by, str) else list(by)
+        groups = [sample[name] for name in by] if by else [np.zeros(len(sample), dtype=np.int8)]
+        n, N = self._strata()
+        weight = (N / n).reindex(sample['_stratum']).to_numpy()
+        y = sample[column].to_numpy(dtype=float)
+
+        weighted = pd.DataFrame({'wy': weight * y, 'w': weight})
+        totals = weighted.groupby(groups, observed=True).transform('sum')
+        ratio = totals['wy'].to_numpy() / totals['w'].to_numpy()
+
+        # Variance of the weighted total of z = y - ratio within the group, summed over the strata
+        z = pd.DataFrame({'z': y - ratio, 'z2': (y - ratio) ** 2})
+        cells = z.groupby([sample['_stratum']] + groups, observed=True).sum()
+        stratum = cells.index.get_level_values(0)
+        n_h, N_h = n.reindex(stratum).to_numpy(), N.reindex(stratum).to_numpy()
+        s2 = (cells['z2'].to_numpy() - cells['z'].to_numpy() ** 2 / n_h) / np.maximum(n_h - 1, 1)
+        cells['variance'] = N_h ** 2 * (1 - n_h / N_h) * s2 / n_h
+
+        levels = list(range(1, cells.index.nlevels))
+        variance = cells['variance'].groupby(level=levels).sum()
+        group_totals = weighted.groupby(groups, observed=True).sum()
+        result = pd.DataFrame({'estimate': group_totals['wy'] / group_totals['w']})
+        result['std_error'] = np.sqrt(variance.to_numpy()) / group_totals['w'].to_numpy()
+        if not by:
+            return result.reset_index(drop=True)
+        result.index.names = by
+        return result
@@ -0,0 +1,250 @@
+'''
+Columnar helpers for the wrangled Baywheels trip table.
+
+Every column of the trip dataframe is turned into a plain NumPy array: numbers stay as they are,
+datetimes are kept as int64 nanoseconds, and text / category columns are dictionary-encoded into
+small integer codes with their categories kept aside as a separate (fixed-width) array.
+That is what lets the table be placed once in shared memory and attached by any number of
+worker processes, instead of pickling the whole 600k rows into each one of them.
+The same columns are also saved as an on-disk cache (one .npy file per column, one more for the categories
+of each dictionary column, plus a small JSON header), which is opened memory-mapped so the notebooks reload the table without re-parsing the CSV file.
+'''
+import json
+import os
+import uuid
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+# Timestamps are written to the CSV files as text, these are turned back into datetimes before encoding
+DATE_COLUMNS = ['start_time', 'end_time']
+
+
+def _code_dtype(n_categories):
+    # Same choice pandas makes for Categorical codes, so decoding never has to cast (or copy).
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _category_array(categories):
+    # Plain (fixed-width) NumPy array of the categories, which np.save and shared memory can hold without pickling
+    array = np.asarray(categories.tolist())
+    return array.astype(str) if array.dtype == object else array
+
+
+def encode_columns(df):
+    '''
+    This function takes a trip dataframe and returns a list of (column name, array, categories, spec) tuples
+    , where the array is a flat NumPy array holding the column, categories is the NumPy array of the categories
+    of a dictionary column (None for the other ones), and the spec tells how to turn it back
+    , i.e. {'kind': 'numeric'}, {'kind': 'datetime'} or {'kind': 'dictionary'}.
+    '''
+    columns = []
+    for name in df.columns:
+        series = df[name]
+        if name in DATE_COLUMNS and not pd.api.types.is_datetime64_any_dtype(series):
+            # Otherwise every distinct timestamp string would become a category
+            series = pd.to_datetime(series)
+        categories = None
+        if pd.api.types.is_datetime64_any_dtype(series):
+            array = series.to_numpy(dtype='datetime64[ns]').view('i8')
+            spec = {'kind': 'datetime'}
+        elif pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+            array = series.to_numpy()
+            spec = {'kind': 'numeric'}
+        else:
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                codes, categories = series.cat.codes.to_numpy(), series.cat.categories
+            else:
+                # Missing values get the code -1, which is what Categorical.from_codes expects for NaN
+                codes, categories = pd.factorize(series)
+            array = codes.astype(_code_dtype(len(categories)), copy=False)
+            categories = _category_array(categories)
+            spec = {'kind': 'dictionary'}
+        columns.append((name, np.ascontiguousarray(array), categories, spec))
+    return columns
+
+
+def decode_column(array, spec, categories=None):
+    '''
+    This function is the reverse of encode_columns for a single column, it takes the stored array, its spec
+    and categories, and returns an array-like (NumPy view or pandas Categorical) that reuses the same memory
+    for the rows instead of copying them.
+    '''
+    if spec['kind'] == 'datetime':
+        return array.view('datetime64[ns]')
+    if spec['kind'] == 'dictionary':
+        return pd.Categorical.from_codes(array, categories=categories)
+    return array
+
+
+def share_trip_table(df):
+    '''
+    This function copies the trip dataframe once into a single shared memory block
+    , the columns as well as the categories of the dictionary columns (as fixed-width NumPy arrays).
+    It returns the SharedMemory object (keep a reference to it, then close() and unlink() it when all workers are done)
+    , and a small picklable layout dictionary (offsets and dtypes only) that is all a worker needs to attach to the table.
+    '''
+    columns = encode_columns(df)
+    arrays = [array for _, array, categories, _ in columns for array in (array, categories) if array is not None]
+    offsets, size = [], 0
+    for array in arrays:
+        offsets.append(size)
+        size += -(-array.nbytes // 8) * 8 # Keeping every array 8-byte aligned
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for array, offset in zip(arrays, offsets):
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf, offset=offset)[:] = array
+
+    layout = {'name': shm.name, 'rows': len(df), 'columns': []}
+    placed = iter(zip(arrays, offsets))
+    for name, _, categories, spec in columns:
+        array, offset = next(placed)
+        spec = dict(spec, name=name, dtype=array.dtype.str, offset=offset)
+        if categories is not None:
+            categories, offset = next(placed)
+            spec['categories'] = {'dtype': categories.dtype.str, 'offset': offset, 'length': len(categories)}
+        layout['columns'].append(spec)
+    return shm, layout
+
+
+def _shared_array(shm, length, dtype, offset):
+    array = np.ndarray(length, dtype=dtype, buffer=shm.buf, offset=offset)
+    array.flags.writeable = False
+    return array
+
+
+def attach_trip_table(layout):
+    '''
+    This function attaches to a table created by share_trip_table, without copying any of the rows.
+    It returns the SharedMemory object (only close() it from a worker, the owner is the one to unlink() it)
+    , and a dictionary of read-only columns that can be passed as-is to seaborn's data argument
+    , or to pd.DataFrame() when a private copy is really needed.
+    '''
+    shm = shared_memory.SharedMemory(name=layout['name'])
+    table = {}
+    for spec in layout['columns']:
+        array = _shared_array(shm, layout['rows'], spec['dtype'], spec['offset'])
+        categories = None
+        if 'categories' in spec:
+            found = spec['categories']
+            categories = _shared_array(shm, found['length'], found['dtype'], found['offset'])
+        table[spec['name']] = decode_column(array, spec, categories)
+    return shm, table
+
+
+_worker_table = None
+
+
+def init_worker(layout):
+    '''
+    This function is meant to be used as a multiprocessing.Pool initializer
+    , e.g. Pool(4, initializer=init_worker, initargs=(layout,)), so each worker attaches to the table once.
+    '''
+    global _worker_table
+    _worker_table = attach_trip_table(layout)
+
+
+def worker_trip_table():
+    '''
+    This function returns the columns attached by init_worker inside the current worker process.
+    '''
+    return _worker_table[1]
+
+
+def _options_key(read_csv_kwargs):
+    # JSON friendly description of the read_csv options (e.g. dtype={'x': object}), only used to compare them
+    return json.loads(json.dumps(read_csv_kwargs, sort_keys=True, default=str))
+
+
+def save_trip_cache(df, directory, source=None, read_csv_kwargs=None):
+    '''
+    This function saves the trip dataframe as a columnar cache inside the given directory
+    , one <build>.<column>.npy file per column (plus <build>.<column>.categories.npy for dictionary columns)
+    , and a small header.json file describing them.
+    If a source file is given, its size and modification time are recorded, together with the read_csv options
+    it was parsed with, so read_trip_table can tell when the cache is stale.
+    Every rebuild writes new files and only then switches header.json over to them, since rewriting a file in place
+    would crash any process that still has the previous cache memory-mapped (e.g. the slide deck's kernel).
+    '''
+    os.makedirs(directory, exist_ok=True)
+    build = uuid.uuid4().hex[:12]
+    header = {'rows': len(df), 'source': None, 'columns': []}
+    if source is not None:
+        stat = os.stat(source)
+        header['source'] = {'path': os.path.abspath(source), 'size': stat.st_size, 'mtime': stat.st_mtime,
+                            'read_csv_kwargs': _options_key(read_csv_kwargs or {})}
+
+    for name, array, categories, spec in encode_columns(df):
+        spec = dict(spec, name=name, file=f'{build}.{name}.npy')
+        np.save(os.path.join(directory, spec['file']), array, allow_pickle=False)
+        if categories is not None:
+            spec['categories'] = f'{build}.{name}.categories.npy'
+            np.save(os.path.join(directory, spec['categories']), categories, allow_pickle=False)
+        header['columns'].append(spec)
+
+    # The header is written last, so a half written cache is never picked up
+    with open(os.path.join(directory, 'header.json.tmp'), 'w') as f:
+        json.dump(header, f)
+    os.replace(os.path.join(directory, 'header.json.tmp'), os.path.join(directory, 'header.json'))
+
+    # Removing the previous builds: processes that still map them keep their data until they let go of it
+    current = {spec[key] for spec in header['columns'] for key in ('file', 'categories') if key in spec}
+    for file_name in os.listdir(directory):
+        if file_name.endswith('.npy') and file_name not in current:
+            try:
+                os.remove(os.path.join(directory, file_name))
+            except OSError:
+                pass # e.g. Windows, which doesn't delete files that are still open, the next rebuild tries again
+
+
+def load_trip_cache(directory):
+    '''
+    This function opens a cache written by save_trip_cache and returns it as a dataframe.
+    Every column is opened with np.load(mmap_mode='r'), so nothing is read from disk until a chart actually touches it.
+    '''
+    with open(os.path.join(directory, 'header.json')) as f:
+        header = json.load(f)
+    table = {}
+    for spec in header['columns']:
+        array = np.load(os.path.join(directory, spec['file']), mmap_mode='r', allow_pickle=False)
+        categories = None
+        if 'categories' in spec:
+            categories = np.load(os.path.join(directory, spec['categories']), allow_pickle=False)
+        table[spec['name']] = decode_column(array, spec, categories)
+    # copy=False keeps each column in its own block, i.e. the dataframe stays on top of the memory maps
+    return pd.DataFrame(table, copy=False)
+
+
+def cache_is_fresh(directory, source, read_csv_kwargs=None):
+    '''
+    This function checks whether the cache in the given directory was built from the current version of the source file
+    , parsed with the same read_csv options.
+    '''
+    try:
+        with open(os.path.join(directory, 'header.json')) as f:
+            recorded = json.load(f)['source']
+        stat = os.stat(source)
+    except (OSError, ValueError, KeyError):
+        return False
+    return (recorded is not None and recorded['size'] == stat.st_size and recorded['mtime'] == stat.st_mtime
+            and recorded.get('read_csv_kwargs') == _options_key(read_csv_kwargs or {}))
+
+
+def read_trip_table(csv_path, cache_dir=None, **read_csv_kwargs):
+    '''
+    This function replaces pd.read_csv on the wrangled trip table.
+    The first call parses the CSV file and builds the cache next to it (e.g. wrangled_baywheels_2020.cache)
+    , later calls just open the memory-mapped cache, until the CSV file is written again or other read_csv options are given.
+    'start_time' and 'end_time' come back as datetimes (parsed by read_csv unless other parse_dates are given)
+    , and every text column comes back as a pandas Categorical, whatever dtype it was read with
+    (dtype= still matters for parsing the CSV file, e.g. {'rental_access_method': object}).
+    '''
+    if cache_dir is None:
+        cache_dir = os.path.splitext(csv_path)[0] + '.cache'
+    read_csv_kwargs.setdefault('parse_dates', DATE_COLUMNS)
+    if not cache_is_fresh(cache_dir, csv_path, read_csv_kwargs):
+        save_trip_cache(pd.read_csv(csv_path, **read_csv_kwargs), cache_dir, source=csv_path, read_csv_kwargs=read_csv_kwargs)
+    return load_trip_cache(cache_dir)